@@ -1,10 +1,24 @@
 import streamlit as st
+import hashlib
+import inspect
+import logging
+import os
+import re
+import tempfile
+import numpy as np
 import pandas as pd
-import plotly.express as px
+import pyarrow as pa
 import plotly.graph_objects as go
 from pathlib import Path
 from pyproj import Transformer
 import pydeck as pdk
+import h3
+
+try:
+    import cupy as cp
+    from cuproj.transformer import Transformer as GPUTransformer
+except ImportError:
+    cp = None
 
 # ==================================================
 # 1. CONFIGURACIÓN Y ESTILO VISUAL
@@ -26,6 +40,18 @@ COLOR_MAP_LESIVIDAD = {
     "Se desconoce": "Silver"
 }
 
+COLOR_RANGE_MAPA = [[255, 255, 178], [254, 204, 92], [253, 141, 60], [240, 59, 32], [189, 0, 38]]
+H3_RESOLUCION = 9
+
+LESIVIDAD_GRAVES = ['Ingreso superior a 24 horas', 'Fallecido 24 horas']
+
+ORDEN_EDAD = [
+    "Menor de 5 años", "De 6 a 9 años", "De 10 a 14 años", "De 15 a 17 años", "De 18 a 20 años",
+    "De 21 a 24 años", "De 25 a 29 años", "De 30 a 34 años", "De 35 a 39 años", "De 40 a 44 años",
+    "De 45 a 49 años", "De 50 a 54 años", "De 55 a 59 años", "De 60 a 64 años", "De 65 a 69 años",
+    "De 70 a 74 años", "> 74", "Desconocido"
+]
+
 st.markdown("""
     <style>
     h1 { font-family: 'Helvetica Neue', sans-serif; color: Black; font-size: 2.5rem; }
@@ -82,7 +108,86 @@ st.markdown("""
 # ==================================================
 # 2. CARGA DE DATOS
 # ==================================================
-@st.cache_data
+def utm_to_wgs84(x_utm, y_utm):
+    if cp is not None:
+        try:
+            # cuProj sólo admite UTM WGS84 (EPSG:326xx); ETRS89 y WGS84 coinciden a escala de metro.
+            # Sigue el orden de ejes de EPSG:4326 (lat, lon) y no admite always_xy
+            transformer = GPUTransformer.from_crs("EPSG:32630", "EPSG:4326")
+            lat, lon = transformer.transform(cp.asarray(x_utm), cp.asarray(y_utm))
+            return cp.asnumpy(lon), cp.asnumpy(lat)
+        except (RuntimeError, ValueError) as exc:
+            logging.getLogger(__name__).warning("cuProj no disponible, se usa pyproj en CPU: %s", exc)
+
+    transformer = Transformer.from_crs("EPSG:25830", "EPSG:4326", always_xy=True)
+    return transformer.transform(x_utm, y_utm)
+
+def read_dataset(data_path):
+    df = pd.read_csv(data_path, sep=";", encoding="utf-8-sig", engine="pyarrow", dtype_backend="pyarrow",
+                     dtype={"hora": pd.ArrowDtype(pa.string())})
+
+    df["fecha"] = pd.to_datetime(df["fecha"], dayfirst=True)
+    df["hora_num"] = pd.to_numeric(df["hora"].str.slice(stop=-6), errors="coerce").astype("Int8")
+
+    orden = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
+    df["dia_semana"] = pd.Categorical.from_codes(df["fecha"].dt.dayofweek.fillna(-1).astype("int8").to_numpy(), categories=orden, ordered=True)
+
+    x_utm = df["coordenada_x_utm"].to_numpy(dtype="float64", na_value=np.nan)
+    y_utm = df["coordenada_y_utm"].to_numpy(dtype="float64", na_value=np.nan)
+    lon, lat = utm_to_wgs84(x_utm, y_utm)
+    df["lon"] = lon.astype("float32")
+    df["lat"] = lat.astype("float32")
+    df["h3"] = np.array([h3.api.numpy_int.latlng_to_cell(la, lo, H3_RESOLUCION) if np.isfinite(la) and np.isfinite(lo) else 0
+                         for la, lo in zip(lat, lon)], dtype=np.uint64)
+
+    df['alcohol'] = (df['positiva_alcohol'] == 'S').fillna(False).astype(bool)
+    df['rango_edad'] = df['rango_edad'].replace({'Más de 74 años': '> 74'})
+
+    df['lesividad'] = df['lesividad'].fillna("Se desconoce")
+
+    lesividad_extra = sorted(set(df['lesividad'].dropna().unique()) - set(COLOR_MAP_LESIVIDAD))
+    categorias = {
+        "sexo": ["Hombre", "Mujer", "Desconocido"],
+        "tipo_persona": ["Conductor", "Pasajero", "Peatón"],
+        "lesividad": list(COLOR_MAP_LESIVIDAD) + lesividad_extra,
+        "tipo_vehiculo": sorted(df["tipo_vehiculo"].dropna().unique()),
+        "distrito": sorted(df["distrito"].dropna().unique())
+    }
+    for col, cats in categorias.items():
+        df[col] = pd.Categorical(df[col], categories=cats)
+    df["rango_edad"] = pd.Categorical(df["rango_edad"], categories=ORDEN_EDAD, ordered=True)
+
+    return df
+
+def dataset_cache_key():
+    fuente = inspect.getsource(utm_to_wgs84) + inspect.getsource(read_dataset)
+    fuente += repr((COLOR_MAP_LESIVIDAD, ORDEN_EDAD, H3_RESOLUCION))
+    return hashlib.sha1(fuente.encode("utf-8")).hexdigest()[:12]
+
+def read_cached_dataset(parquet_path):
+    df = pd.read_parquet(parquet_path)
+    columnas_texto = df.select_dtypes("string").columns
+    return df.astype({col: pd.ArrowDtype(pa.string()) for col in columnas_texto})
+
+def write_cached_dataset(df, parquet_path, data_path):
+    tmp_path = None
+    try:
+        parquet_path.parent.mkdir(exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=parquet_path.parent, prefix=f"{data_path.stem}.", suffix=".parquet.tmp")
+        os.close(fd)
+        df.to_parquet(tmp_path, compression="zstd")
+        os.replace(tmp_path, parquet_path)
+    except OSError:
+        if tmp_path is not None:
+            Path(tmp_path).unlink(missing_ok=True)
+        return
+
+    patron = re.compile(rf"{re.escape(data_path.stem)}\.[0-9a-f]{{12}}\.parquet")
+    for antiguo in parquet_path.parent.iterdir():
+        if antiguo != parquet_path and patron.fullmatch(antiguo.name):
+            antiguo.unlink(missing_ok=True)
+
+@st.cache_resource
 def load_data():
     base_dir = Path(__file__).resolve().parent
     data_path = base_dir / "2024_Accidentalidad.csv"
@@ -93,32 +198,77 @@ def load_data():
         st.error("No se encuentra el dataset. Verifica la ruta.")
         st.stop()
 
-    df = pd.read_csv(data_path, sep=";", encoding="utf-8-sig", low_memory=False)
+    parquet_path = base_dir / ".cache" / f"{data_path.stem}.{dataset_cache_key()}.parquet"
+    df = None
+    if parquet_path.exists() and parquet_path.stat().st_mtime >= data_path.stat().st_mtime:
+        try:
+            df = read_cached_dataset(parquet_path)
+        except Exception:
+            df = None
+
+    if df is None:
+        df = read_dataset(data_path)
+        write_cached_dataset(df, parquet_path, data_path)
+
+    kpis = {
+        "total": len(df),
+        "distrito_top": df['distrito'].mode()[0],
+        "graves": int(df['lesividad'].isin(LESIVIDAD_GRAVES).sum())
+    }
+    hour_groups = df.groupby("hora_num").indices
+    scenario_idx = {
+        "Sólo graves o mortales": np.flatnonzero(df['lesividad'].isin(LESIVIDAD_GRAVES)),
+        "Sólo atropellos": np.flatnonzero(df['tipo_persona'] == 'Peatón')
+    }
+    alc_hour_day = df[df['alcohol'].to_numpy()].groupby(["hora_num", "dia_semana"], observed=True).size().unstack(fill_value=0)
 
-    df["fecha"] = pd.to_datetime(df["fecha"], dayfirst=True)
-    df["hora_dt"] = pd.to_datetime(df["hora"], format="%H:%M:%S", errors="coerce")
-    df["hora_num"] = df["hora_dt"].dt.hour
+    return df, kpis, hour_groups, scenario_idx, alc_hour_day
 
-    dias_map = {"Monday": "Lunes", "Tuesday": "Martes", "Wednesday": "Miércoles", "Thursday": "Jueves",
-                "Friday": "Viernes", "Saturday": "Sábado", "Sunday": "Domingo"}
-    df["dia_semana"] = df["fecha"].dt.day_name().map(dias_map)
+df, kpis, hour_groups, scenario_idx, alc_hour_day = load_data()
 
-    orden = ["Lunes", "Martes", "Miércoles", "Jueves", "Viernes", "Sábado", "Domingo"]
-    df["dia_semana"] = pd.Categorical(df["dia_semana"], categories=orden, ordered=True)
+@st.cache_data
+def hex_agg(hour, scenario):
+    idx = hour_groups.get(hour, np.array([], dtype=np.int64))
+    if scenario in scenario_idx:
+        idx = np.intersect1d(idx, scenario_idx[scenario], assume_unique=True)
 
-    transformer = Transformer.from_crs("EPSG:25830", "EPSG:4326", always_xy=True)
-    lon, lat = transformer.transform(df["coordenada_x_utm"].values, df["coordenada_y_utm"].values)
-    df["lon"] = lon
-    df["lat"] = lat
+    df_hora = df.iloc[idx].dropna(subset=["lat", "lon"])
 
-    df['alcohol'] = df['positiva_alcohol'] == 'S'
-    df['rango_edad'] = df['rango_edad'].replace({'Más de 74 años': '> 74'})
+    if df_hora.empty:
+        return pd.DataFrame(columns=["h3", "count", "elevation", "color"])
 
-    df['lesividad'] = df['lesividad'].fillna("Se desconoce")
+    df_hex = df_hora["h3"].value_counts().rename_axis("h3").reset_index(name="count")
+    df_hex["h3"] = [h3.int_to_str(int(c)) for c in df_hex["h3"]]
 
-    return df
+    n_min, n_max = df_hex["count"].min(), df_hex["count"].max()
+    df_hex["elevation"] = df_hex["count"] / n_max * 1000
+    tramo = ((df_hex["count"] - n_min) / max(n_max - n_min, 1) * len(COLOR_RANGE_MAPA)).astype(int)
+    df_hex["color"] = [COLOR_RANGE_MAPA[i] for i in tramo.clip(upper=len(COLOR_RANGE_MAPA) - 1)]
 
-df = load_data()
+    return df_hex
+
+@st.cache_data
+def vul_matrix():
+    conteo = df.groupby(["tipo_vehiculo", "lesividad"], observed=True).size()
+    total = df.groupby("tipo_vehiculo", observed=True).size()
+    return (conteo / total * 100).rename("pct").reset_index()
+
+@st.cache_data
+def gender_matrix():
+    df_sex = df[df["sexo"].isin(["Hombre", "Mujer"])]
+    ct = pd.crosstab(df_sex["sexo"], df_sex["tipo_persona"], normalize="index") * 100
+    return ct.reindex(["Hombre", "Mujer"])
+
+@st.cache_data
+def severity_counts():
+    graves = ['Ingreso superior a 24 horas', 'Ingreso inferior o igual a 24 horas', 'Fallecido 24 horas']
+    mask = df["sexo"].isin(["Hombre", "Mujer"]) & df["lesividad"].isin(graves)
+    vc = df.loc[mask, "sexo"].value_counts()
+    return vc[vc > 0]
+
+@st.cache_data
+def age_pyramid():
+    return pd.crosstab(df["rango_edad"], df["sexo"]).reindex(ORDEN_EDAD, fill_value=0)
 
 # ==================================================
 # SIDEBAR COMPLETA (CONTEXTO Y DATOS)
@@ -211,10 +361,10 @@ st.markdown("""
 
 col1, col2, col3, col4 = st.columns(4)
 
-total_personas = len(df)
+total_personas = kpis["total"]
 media_diaria = int(total_personas / 366)
-distrito_top = df['distrito'].mode()[0]
-graves_count = len(df[df['lesividad'].isin(['Ingreso superior a 24 horas', 'Fallecido 24 horas'])])
+distrito_top = kpis["distrito_top"]
+graves_count = kpis["graves"]
 
 with col1:
     st.markdown(f"""
@@ -253,339 +403,353 @@ st.write("")
 # ==================================================
 # 1. MAPA DE ACCIDENTES
 # ==================================================
-st.markdown("## 1. La huella urbana del riesgo")
+@st.fragment
+def section_map():
+    st.markdown("## 1. La huella urbana del riesgo")
 
-c1_txt, c1_viz = st.columns([1, 3])
+    c1_txt, c1_viz = st.columns([1, 3])
 
-with c1_txt:
-    st.write("")
-    st.write("")
-    st.markdown("""
-    <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid Crimson; color: Gainsboro; box-shadow: 0 4px 6px Black;">
-        <h4 style="margin: 0 0 10px 0; color: White; font-size: 1.1rem;">Dinámica urbana</h4>
-        <p style="font-size: 0.95rem; line-height: 1.5; margin-bottom: 0;">
-            El riesgo no es estático, el tráfico se mueve y durante las diferentes horas migra del centro a la periferia y viceversa.
-            <br><br>
-            Moviendo el slider podemos ver cómo se transforma el mapa de calor.
-        </p>
-    </div>
-    """, unsafe_allow_html=True)
+    with c1_txt:
+        st.write("")
+        st.write("")
+        st.markdown("""
+        <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid Crimson; color: Gainsboro; box-shadow: 0 4px 6px Black;">
+            <h4 style="margin: 0 0 10px 0; color: White; font-size: 1.1rem;">Dinámica urbana</h4>
+            <p style="font-size: 0.95rem; line-height: 1.5; margin-bottom: 0;">
+                El riesgo no es estático, el tráfico se mueve y durante las diferentes horas migra del centro a la periferia y viceversa.
+                <br><br>
+                Moviendo el slider podemos ver cómo se transforma el mapa de calor.
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
 
-    st.markdown("---")
-    escenario = st.radio(
-        "Filtro por tipo de accidente:",
-        ["Todo el tráfico", "Sólo graves o mortales", "Sólo atropellos"],
-        index=0
-    )
+        st.markdown("---")
+        escenario = st.radio(
+            "Filtro por tipo de accidente:",
+            ["Todo el tráfico", "Sólo graves o mortales", "Sólo atropellos"],
+            index=0
+        )
 
-    hora_mapa = st.slider("Filtro por hora del día:", 0, 23, 19, format="%dh")
+        hora_mapa = st.slider("Filtro por hora del día:", 0, 23, 19, format="%dh")
 
-    if escenario == "Sólo graves o mortales":
-        st.caption("Mostrando solo ingresos >24h o fallecidos.")
-    elif escenario == "Sólo atropellos":
-        st.caption("Mostrando zonas de conflicto vehículo-peatón.")
+        if escenario == "Sólo graves o mortales":
+            st.caption("Mostrando solo ingresos >24h o fallecidos.")
+        elif escenario == "Sólo atropellos":
+            st.caption("Mostrando zonas de conflicto vehículo-peatón.")
 
-with c1_viz:
-    st.write("")
-    df_map = df[df["hora_num"] == hora_mapa].dropna(subset=["lat", "lon"])
-
-    if escenario == "Sólo graves o mortales":
-        graves = ['Ingreso superior a 24 horas', 'Fallecido 24 horas']
-        df_map = df_map[df_map['lesividad'].isin(graves)]
-    elif escenario == "Sólo atropellos":
-        df_map = df_map[df_map['tipo_persona'] == 'Peatón']
-
-    if df_map.empty:
-        st.warning(f"No hay datos para esta hora con el filtro '{escenario}'. Prueba otra hora.")
-    else:
-        view_state = pdk.ViewState(latitude=40.4168, longitude=-3.7038, zoom=11, pitch=45)
-        layer = pdk.Layer(
-            "HexagonLayer",
-            data=df_map,
-            get_position="[lon, lat]",
-            radius=120,
-            elevation_scale=4,
-            elevation_range=[0, 1000],
-            extruded=True,
-            pickable=True,
-            opacity=0.8,
-            color_range=[[255, 255, 178], [254, 204, 92], [253, 141, 60], [240, 59, 32], [189, 0, 38]]
-        )
-        st.pydeck_chart(pdk.Deck(
-            map_style="https://basemaps.cartocdn.com/gl/dark-matter-gl-style/style.json",
-            initial_view_state=view_state,
-            layers=[layer],
-            tooltip={"html": f"<b>{escenario}</b><br/>En este hexágono: <b>{{elevationValue}}</b> afectados.", "style": {"color": "white"}}
-        ))
+    with c1_viz:
+        st.write("")
+        df_map = hex_agg(hora_mapa, escenario)
+
+        if df_map.empty:
+            st.warning(f"No hay datos para esta hora con el filtro '{escenario}'. Prueba otra hora.")
+        else:
+            view_state = pdk.ViewState(latitude=40.4168, longitude=-3.7038, zoom=11, pitch=45)
+            layer = pdk.Layer(
+                "H3HexagonLayer",
+                data=df_map,
+                get_hexagon="h3",
+                get_elevation="elevation",
+                get_fill_color="color",
+                elevation_scale=4,
+                extruded=True,
+                pickable=True,
+                opacity=0.8
+            )
+            st.pydeck_chart(pdk.Deck(
+                map_style="https://basemaps.cartocdn.com/gl/dark-matter-gl-style/style.json",
+                initial_view_state=view_state,
+                layers=[layer],
+                tooltip={"html": f"<b>{escenario}</b><br/>En este hexágono: <b>{{count}}</b> afectados.", "style": {"color": "white"}}
+            ))
 
-st.markdown("""
-<div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid GoldenRod; color: Gainsboro;">
-    <span style="color: GoldenRod; font-weight: bold; font-size: 1rem;">Lectura de datos</span>
-    <p style="margin-top: 5px; font-size: 0.9rem; line-height: 1.4; color: LightGray;">
-        La densidad de incidentes satura la almendra central, barrios como Chamberí, Centro, Salamanca se saturan de accidentes
-        en horario comercial. Por otro lado, en los anillos que rodean la ciudad, los accidentes más graves destacan, por el aumento de
-        la velocidad.
-    </p>
-</div>
-""", unsafe_allow_html=True)
+    st.markdown("""
+    <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid GoldenRod; color: Gainsboro;">
+        <span style="color: GoldenRod; font-weight: bold; font-size: 1rem;">Lectura de datos</span>
+        <p style="margin-top: 5px; font-size: 0.9rem; line-height: 1.4; color: LightGray;">
+            La densidad de incidentes satura la almendra central, barrios como Chamberí, Centro, Salamanca se saturan de accidentes
+            en horario comercial. Por otro lado, en los anillos que rodean la ciudad, los accidentes más graves destacan, por el aumento de
+            la velocidad.
+        </p>
+    </div>
+    """, unsafe_allow_html=True)
+
+section_map()
 
 # ==================================================
 # 2. ALCOHOL EN FIN DE SEMANA
 # ==================================================
-st.markdown("## 2. Factor de riesgo: Alcohol y ocio")
+@st.fragment
+def section_alcohol():
+    st.markdown("## 2. Factor de riesgo: Alcohol y ocio")
 
-c_alc1, c_alc2 = st.columns([1, 2])
+    c_alc1, c_alc2 = st.columns([1, 2])
 
-with c_alc1:
-    st.write("")
-    st.write("")
+    with c_alc1:
+        st.write("")
+        st.write("")
 
-    st.markdown("""
-    <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid Crimson; color: Gainsboro; box-shadow: 0 4px 6px Black;">
-        <h4 style="margin: 0 0 10px 0; color: White; font-size: 1.1rem;">Alcohol y ocio nocturo</h4>
-        <p style="font-size: 0.95rem; line-height: 1.5; margin-bottom: 0;">
-            Existe una tendencia a la accidentalidad cuando la vida se vincula al alcohol. Si visualizamos sólo los fines de
-            semana podemos evidenciar picos de actividad y con ello de accidentabilidad.
-        </p>
-    </div>
-    """, unsafe_allow_html=True)
+        st.markdown("""
+        <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid Crimson; color: Gainsboro; box-shadow: 0 4px 6px Black;">
+            <h4 style="margin: 0 0 10px 0; color: White; font-size: 1.1rem;">Alcohol y ocio nocturo</h4>
+            <p style="font-size: 0.95rem; line-height: 1.5; margin-bottom: 0;">
+                Existe una tendencia a la accidentalidad cuando la vida se vincula al alcohol. Si visualizamos sólo los fines de
+                semana podemos evidenciar picos de actividad y con ello de accidentabilidad.
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
 
-    st.markdown("---")
+        st.markdown("---")
 
-    dias_posibles = ["Viernes", "Sábado", "Domingo"]
-    dias_sel = st.multiselect("Filtro por día de la semana (activar o desactivar días):", options=dias_posibles, default=dias_posibles)
+        dias_posibles = ["Viernes", "Sábado", "Domingo"]
+        dias_sel = st.multiselect("Filtro por día de la semana (activar o desactivar días):", options=dias_posibles, default=dias_posibles)
 
-with c_alc2:
+    with c_alc2:
 
-    df_alc = df[(df["alcohol"] == True) & (df["dia_semana"].isin(dias_sel))].copy()
-    df_alc["dia_semana"] = df_alc["dia_semana"].cat.remove_unused_categories()
+        dias_orden = [d for d in alc_hour_day.columns if d in dias_sel]
+        colores_dia = {"Viernes": "MediumSlateBlue", "Sábado": "Orange", "Domingo": "MediumSeaGreen"}
 
-    if not df_alc.empty:
-        counts = df_alc.groupby(["hora_num", "dia_semana"], observed=True).size().reset_index(name="n")
+        if dias_orden:
 
-        fig_alc = px.line(
-            counts, x="hora_num", y="n", color="dia_semana",
-            title="Evolución horaria de positivos en alcohol",
-            markers=True,
-            labels={"hora_num": "Hora del día", "n": "Nº Positivos", "dia_semana": "Día"},
-            color_discrete_map={"Viernes": "MediumSlateBlue", "Sábado": "Orange", "Domingo": "MediumSeaGreen"}
-        )
-        fig_alc.update_layout(xaxis=dict(tickmode='linear', dtick=2))
+            fig_alc = go.Figure()
+            for dia in dias_orden:
+                serie = alc_hour_day[dia]
+                serie = serie[serie > 0]
+                fig_alc.add_trace(go.Scattergl(
+                    x=serie.index.to_numpy(), y=serie.to_numpy(), name=dia,
+                    mode="lines+markers", line_color=colores_dia[dia]
+                ))
+            fig_alc.update_layout(
+                title="Evolución horaria de positivos en alcohol",
+                xaxis=dict(tickmode='linear', dtick=2, title="Hora del día"),
+                yaxis_title="Nº Positivos",
+                legend_title="Día"
+            )
 
-        fig_alc.update_traces(
-            hovertemplate="<b>Hora:</b> %{x}:00 h<br><b>Día:</b> %{fullData.name}<br><b>Detecciones:</b> %{y} conductores positivos<extra></extra>"
-        )
+            fig_alc.update_traces(
+                hovertemplate="<b>Hora:</b> %{x}:00 h<br><b>Día:</b> %{fullData.name}<br><b>Detecciones:</b> %{y} conductores positivos<extra></extra>"
+            )
 
-        st.plotly_chart(fig_alc, use_container_width=True)
-    else:
-        st.info("Selecciona un día del fin de semana para visualizar los datos.")
+            st.plotly_chart(fig_alc, use_container_width=True)
+        else:
+            st.info("Selecciona un día del fin de semana para visualizar los datos.")
 
-st.markdown("""
-<div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid GoldenRod; color: Gainsboro;">
-    <span style="color: GoldenRod; font-weight: bold; font-size: 1rem;">Lectura de datos</span>
-    <p style="margin-top: 5px; font-size: 0.9rem; line-height: 1.4; color: LightGray;">
-        Se puede apreciar cómo el pico de riesgo se desplaza hacia la madrugada, correlacionando el cierre de locales de ocio con la siniestralidad.
-    </p>
-</div>
-""", unsafe_allow_html=True)
+    st.markdown("""
+    <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid GoldenRod; color: Gainsboro;">
+        <span style="color: GoldenRod; font-weight: bold; font-size: 1rem;">Lectura de datos</span>
+        <p style="margin-top: 5px; font-size: 0.9rem; line-height: 1.4; color: LightGray;">
+            Se puede apreciar cómo el pico de riesgo se desplaza hacia la madrugada, correlacionando el cierre de locales de ocio con la siniestralidad.
+        </p>
+    </div>
+    """, unsafe_allow_html=True)
+
+section_alcohol()
 # ==================================================
 # 3. VULNERABILIDAD (TODOS LOS VEHÍCULOS)
 # ==================================================
-st.markdown("## 3. Vulnerabilidad según vehículo")
+@st.fragment
+def section_vulnerability():
+    st.markdown("## 3. Vulnerabilidad según vehículo")
 
-col_v1, col_v2 = st.columns([1, 3])
+    col_v1, col_v2 = st.columns([1, 3])
 
-with col_v1:
-    st.write("")
-    st.write("")
+    with col_v1:
+        st.write("")
+        st.write("")
 
-    st.markdown("""
-    <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid Crimson; color: Gainsboro; box-shadow: 0 4px 6px Black;">
-        <h4 style="margin: 0 0 10px 0; color: White; font-size: 1.1rem;">Fragilidad en la vía</h4>
-        <p style="font-size: 0.95rem; line-height: 1.5; margin-bottom: 0;">
-            ¿Quién se lleva la peor parte? Analizamos la severidad del impacto según el medio de transporte.
-            <br><br>
-            Leyenda: De tonos verdes (Leve) a rojos/negros (Grave/Mortal).
-        </p>
-    </div>
-    """, unsafe_allow_html=True)
+        st.markdown("""
+        <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid Crimson; color: Gainsboro; box-shadow: 0 4px 6px Black;">
+            <h4 style="margin: 0 0 10px 0; color: White; font-size: 1.1rem;">Fragilidad en la vía</h4>
+            <p style="font-size: 0.95rem; line-height: 1.5; margin-bottom: 0;">
+                ¿Quién se lleva la peor parte? Analizamos la severidad del impacto según el medio de transporte.
+                <br><br>
+                Leyenda: De tonos verdes (Leve) a rojos/negros (Grave/Mortal).
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
 
-    st.markdown("---")
+        st.markdown("---")
 
-    todos_los_vehiculos = sorted(df["tipo_vehiculo"].dropna().unique())
-    seleccion_defecto = ["Turismo", "Motocicleta > 125cc", "Bicicleta", "Peatón", "VMU eléctrico"]
-
-    vehiculos_sel = st.multiselect(
-        "Selecciona vehículos:",
-        options=todos_los_vehiculos,
-        default=[v for v in seleccion_defecto if v in todos_los_vehiculos]
-    )
-
-with col_v2:
-    if vehiculos_sel:
-        df_vul = df[df["tipo_vehiculo"].isin(vehiculos_sel)]
-
-        orden_lesividad = list(COLOR_MAP_LESIVIDAD.keys())
-
-        fig_vul = px.histogram(
-            df_vul,
-            y="tipo_vehiculo",
-            color="lesividad",
-            barnorm="percent",
-            orientation='h',
-            title="Comparativa de gravedad de lesiones por vehículo",
-            text_auto='.0f',
-            color_discrete_map=COLOR_MAP_LESIVIDAD,
-            category_orders={"lesividad": orden_lesividad},
-            labels={"tipo_vehiculo": "", "count": "Porcentaje"}
-        )
-        fig_vul.update_layout(xaxis_title="Porcentaje (%)", legend_title="Grado de lesividad")
+        todos_los_vehiculos = df["tipo_vehiculo"].cat.categories.tolist()
+        seleccion_defecto = ["Turismo", "Motocicleta > 125cc", "Bicicleta", "Peatón", "VMU eléctrico"]
 
-        fig_vul.update_traces(
-            hovertemplate="<b>Vehículo:</b> %{y}<br><b>Consecuencia:</b> %{fullData.name}<br><b>Frecuencia:</b> %{x:.2f}% del total<extra></extra>"
+        vehiculos_sel = st.multiselect(
+            "Selecciona vehículos:",
+            options=todos_los_vehiculos,
+            default=[v for v in seleccion_defecto if v in todos_los_vehiculos]
         )
 
-        st.plotly_chart(fig_vul, use_container_width=True)
+    with col_v2:
+        if vehiculos_sel:
+            df_vul = vul_matrix()
+            df_vul = df_vul[df_vul["tipo_vehiculo"].isin(vehiculos_sel)]
+
+            fig_vul = go.Figure()
+            for lesividad, grupo in df_vul.groupby("lesividad", observed=True):
+                fig_vul.add_trace(go.Bar(
+                    y=grupo["tipo_vehiculo"].tolist(), x=grupo["pct"].to_numpy(), name=lesividad,
+                    orientation='h', marker_color=COLOR_MAP_LESIVIDAD.get(lesividad), texttemplate="%{x:.0f}"
+                ))
+            fig_vul.update_layout(
+                barmode="relative",
+                title="Comparativa de gravedad de lesiones por vehículo",
+                xaxis_title="Porcentaje (%)",
+                legend_title="Grado de lesividad"
+            )
+
+            fig_vul.update_traces(
+                hovertemplate="<b>Vehículo:</b> %{y}<br><b>Consecuencia:</b> %{fullData.name}<br><b>Frecuencia:</b> %{x:.2f}% del total<extra></extra>"
+            )
+
+            st.plotly_chart(fig_vul, use_container_width=True)
 
-st.markdown("""
-<div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid GoldenRod; color: Gainsboro;">
-    <span style="color: GoldenRod; font-weight: bold; font-size: 1rem;">Lectura de datos</span>
-    <p style="margin-top: 5px; font-size: 0.9rem; line-height: 1.4; color: LightGray;">
-        El gráfico revela la "protección de la carrocería": el Turismo presenta mayoritariamente tonos verdes (ilesos/leves).
-        En contraste, Motocicletas y VMU muestran franjas anaranjadas y rojas mucho más anchas, evidenciando que cuando no hay chasis, la probabilidad de hospitalización se dispara.
-    </p>
-</div>
-""", unsafe_allow_html=True)
+    st.markdown("""
+    <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid GoldenRod; color: Gainsboro;">
+        <span style="color: GoldenRod; font-weight: bold; font-size: 1rem;">Lectura de datos</span>
+        <p style="margin-top: 5px; font-size: 0.9rem; line-height: 1.4; color: LightGray;">
+            El gráfico revela la "protección de la carrocería": el Turismo presenta mayoritariamente tonos verdes (ilesos/leves).
+            En contraste, Motocicletas y VMU muestran franjas anaranjadas y rojas mucho más anchas, evidenciando que cuando no hay chasis, la probabilidad de hospitalización se dispara.
+        </p>
+    </div>
+    """, unsafe_allow_html=True)
+
+section_vulnerability()
 
 # ==================================================
 # 4. GÉNERO Y EDAD
 # ==================================================
-st.markdown("## 4. Perspectiva de género y demografía")
-st.write("")
-st.write("")
-st.markdown("""
-<div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid Crimson; color: Gainsboro; box-shadow: 0 4px 6px Black;">
-    <h4 style="margin: 0 0 10px 0; color: White; font-size: 1.1rem;">Sociología de la movilidad</h4>
-    <p style="font-size: 0.95rem; line-height: 1.5; margin-bottom: 0;">
-        La movilidad urbana no es neutra. Los datos reflejan patrones culturales profundos:
-        la <em>"movilidad del cuidado"</em> (trayectos cortos, a pie, mayormente mujeres)
-        frente a la <em>"movilidad pendular"</em> (coche/moto, velocidad, mayormente hombres).
-    </p>
-</div>
-""", unsafe_allow_html=True)
-
-st.write("")
-
-tab_gen1, tab_gen2 = st.tabs(["Brecha de géneros", "Pirámide demográfica"])
+@st.fragment
+def section_gender():
+    st.markdown("## 4. Perspectiva de género y demografía")
+    st.write("")
+    st.write("")
+    st.markdown("""
+    <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid Crimson; color: Gainsboro; box-shadow: 0 4px 6px Black;">
+        <h4 style="margin: 0 0 10px 0; color: White; font-size: 1.1rem;">Sociología de la movilidad</h4>
+        <p style="font-size: 0.95rem; line-height: 1.5; margin-bottom: 0;">
+            La movilidad urbana no es neutra. Los datos reflejan patrones culturales profundos:
+            la <em>"movilidad del cuidado"</em> (trayectos cortos, a pie, mayormente mujeres)
+            frente a la <em>"movilidad pendular"</em> (coche/moto, velocidad, mayormente hombres).
+        </p>
+    </div>
+    """, unsafe_allow_html=True)
 
-with tab_gen1:
     st.write("")
-    c_g1, c_g2 = st.columns(2)
-    df_sex = df[df["sexo"].isin(["Hombre", "Mujer"])]
 
-    with c_g1:
-        st.markdown("### Patrones de movilidad")
+    tab_gen1, tab_gen2 = st.tabs(["Brecha de géneros", "Pirámide demográfica"])
 
-        fig_generos = px.histogram(
-            df_sex, x="sexo", color="tipo_persona",
-            barnorm="percent", text_auto='.0f',
-            title="¿Quién conduce y quién camina?",
-            color_discrete_map={"Conductor": "DarkSlateGray", "Peatón": "GoldenRod", "Pasajero": "Teal"},
-            labels={"sexo": "Género", "tipo_persona": "Rol"}
-        )
+    with tab_gen1:
+        st.write("")
+        c_g1, c_g2 = st.columns(2)
+
+        with c_g1:
+            st.markdown("### Patrones de movilidad")
+
+            ct = gender_matrix()
+            colores_rol = {"Conductor": "DarkSlateGray", "Peatón": "GoldenRod", "Pasajero": "Teal"}
+
+            fig_generos = go.Figure()
+            for rol in ct.columns:
+                fig_generos.add_trace(go.Bar(
+                    x=ct.index.tolist(), y=ct[rol].tolist(), name=rol,
+                    marker_color=colores_rol[rol], texttemplate="%{y:.0f}"
+                ))
+
+            fig_generos.update_layout(
+                barmode="stack",
+                title="¿Quién conduce y quién camina?",
+                xaxis_title="Género",
+                yaxis_title="Porcentaje (%)",
+                legend_title="Rol en la vía"
+            )
+
+            fig_generos.update_traces(
+                hovertemplate="<b>Género:</b> %{x}<br><b>Tipo:</b> %{fullData.name}<br><b>Proporción:</b> %{y:.2f}%<extra></extra>"
+            )
+            st.plotly_chart(fig_generos, use_container_width=True)
+
+            st.write("")
+            st.markdown("""
+            <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid GoldenRod; color: Gainsboro;">
+                <span style="color: GoldenRod; font-weight: bold; font-size: 0.95rem;">Insight:</span>
+                <p style="margin-top: 5px; font-size: 0.9rem; line-height: 1.4; color: LightGray;">
+                    Observa la barra amarilla (Peatones). Proporcionalmente, las mujeres sufren más atropellos, indicando una mayor exposición en desplazamientos a pie.
+                </p>
+            </div>
+            """, unsafe_allow_html=True)
+
+        with c_g2:
+            st.markdown("### Severidad del accidente")
+
+            vc = severity_counts()
+            colores_sexo = {"Hombre": "SteelBlue", "Mujer": "Crimson"}
+
+            fig_pie = go.Figure(go.Pie(
+                labels=vc.index.tolist(), values=vc.values.tolist(),
+                hole=0.4,
+                marker=dict(colors=[colores_sexo[s] for s in vc.index])
+            ))
+            fig_pie.update_layout(title="Proporción en accidentes graves (hospitalización)")
+            fig_pie.update_traces(
+                hovertemplate="<b>Grupo:</b> %{label}<br><b>Impacto grave:</b> %{value} personas<br><b>Porcentaje:</b> %{percent:.2%}<extra></extra>"
+            )
+            st.plotly_chart(fig_pie, use_container_width=True)
+
+            st.write("")
+            st.markdown("""
+            <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid GoldenRod; color: Gainsboro;">
+                <span style="color: GoldenRod; font-weight: bold; font-size: 0.95rem;">Dato clínico:</span>
+                <p style="margin-top: 5px; font-size: 0.9rem; line-height: 1.4; color: LightGray;">
+                    Los hombres representan la mayoría de los ingresos graves. Esto correlaciona con el uso de vehículos de riesgo (motos) y conductas de velocidad.
+                </p>
+            </div>
+            """, unsafe_allow_html=True)
+
+    with tab_gen2:
+        st.write("")
+        st.markdown("### Perfil de edad de los afectados")
 
-        fig_generos.update_layout(
-            xaxis_title="Género",
-            yaxis_title="Porcentaje (%)",
-            legend_title="Rol en la vía"
-        )
+        pyr = age_pyramid()
+        y_age = ORDEN_EDAD
+        df_m, df_f = pyr['Hombre'], pyr['Mujer']
 
-        fig_generos.update_traces(
-            hovertemplate="<b>Género:</b> %{x}<br><b>Tipo:</b> %{fullData.name}<br><b>Proporción:</b> %{y:.2f}%<extra></extra>"
-        )
-        st.plotly_chart(fig_generos, use_container_width=True)
+        fig_pyr = go.Figure()
 
-        st.write("")
-        st.markdown("""
-        <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid GoldenRod; color: Gainsboro;">
-            <span style="color: GoldenRod; font-weight: bold; font-size: 0.95rem;">Insight:</span>
-            <p style="margin-top: 5px; font-size: 0.9rem; line-height: 1.4; color: LightGray;">
-                Observa la barra amarilla (Peatones). Proporcionalmente, las mujeres sufren más atropellos, indicando una mayor exposición en desplazamientos a pie.
-            </p>
-        </div>
-        """, unsafe_allow_html=True)
-
-    with c_g2:
-        st.markdown("### Severidad del accidente")
+        fig_pyr.add_trace(go.Bar(
+            y=y_age, x=df_m*-1, name='Hombres', orientation='h',
+            marker_color='SteelBlue', customdata=df_m,
+            hovertemplate="<b>Rango:</b> %{y}<br><b>Hombres:</b> %{customdata}<extra></extra>"
+        ))
 
-        graves = ['Ingreso superior a 24 horas', 'Ingreso inferior o igual a 24 horas', 'Fallecido 24 horas']
-        df_graves = df_sex[df_sex['lesividad'].isin(graves)]
+        fig_pyr.add_trace(go.Bar(
+            y=y_age, x=df_f, name='Mujeres', orientation='h',
+            marker_color='Crimson',
+            hovertemplate="<b>Rango:</b> %{y}<br><b>Mujeres:</b> %{x}<extra></extra>"
+        ))
 
-        fig_pie = px.pie(
-            df_graves, names="sexo",
-            title="Proporción en accidentes graves (hospitalización)",
-            color="sexo",
-            color_discrete_map={"Hombre": "SteelBlue", "Mujer": "Crimson"},
-            hole=0.4
+        fig_pyr.update_layout(
+            title="Pirámide de edad (Izquierda: Hombres | Derecha: Mujeres)",
+            barmode='overlay',
+            xaxis=dict(tickmode='sync', title='Nº Personas'),
+            yaxis=dict(title='Edad'),
+            legend=dict(x=0, y=1.0),
+            plot_bgcolor='rgba(0,0,0,0)'
         )
-        fig_pie.update_traces(
-            hovertemplate="<b>Grupo:</b> %{label}<br><b>Impacto grave:</b> %{value} personas<br><b>Porcentaje:</b> %{percent:.2%}<extra></extra>"
-        )
-        st.plotly_chart(fig_pie, use_container_width=True)
+        st.plotly_chart(fig_pyr, use_container_width=True)
+
+        st.markdown("---")
 
-        st.write("")
         st.markdown("""
         <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid GoldenRod; color: Gainsboro;">
-            <span style="color: GoldenRod; font-weight: bold; font-size: 0.95rem;">Dato clínico:</span>
-            <p style="margin-top: 5px; font-size: 0.9rem; line-height: 1.4; color: LightGray;">
-                Los hombres representan la mayoría de los ingresos graves. Esto correlaciona con el uso de vehículos de riesgo (motos) y conductas de velocidad.
-            </p>
+            <h5 style="margin: 0 0 10px 0; color: GoldenRod; font-size: 1rem;">Interpretación demográfica</h5>
+            <ul style="font-size: 0.9rem; line-height: 1.6; color: LightGray; margin-bottom: 0;">
+                <li>Pico laboral (25-45 años): El grueso de la siniestralidad ocurre en edad activa probablemente en desplazamientos al trabajo.</li>
+                <li>Los mayores (>65 años): Sufren una incidencia desproporcionada, casi siempre asociada a atropellos graves.</li>
+            </ul>
         </div>
         """, unsafe_allow_html=True)
 
-with tab_gen2:
-    st.write("")
-    st.markdown("### Perfil de edad de los afectados")
-
-    y_age = sorted(df["rango_edad"].dropna().unique())
-    df_m = df[df['sexo']=='Hombre'].groupby('rango_edad').size().reindex(y_age, fill_value=0)
-    df_f = df[df['sexo']=='Mujer'].groupby('rango_edad').size().reindex(y_age, fill_value=0)
-
-    fig_pyr = go.Figure()
-
-    fig_pyr.add_trace(go.Bar(
-        y=y_age, x=df_m*-1, name='Hombres', orientation='h',
-        marker_color='SteelBlue', customdata=df_m,
-        hovertemplate="<b>Rango:</b> %{y}<br><b>Hombres:</b> %{customdata}<extra></extra>"
-    ))
-
-    fig_pyr.add_trace(go.Bar(
-        y=y_age, x=df_f, name='Mujeres', orientation='h',
-        marker_color='Crimson',
-        hovertemplate="<b>Rango:</b> %{y}<br><b>Mujeres:</b> %{x}<extra></extra>"
-    ))
-
-    fig_pyr.update_layout(
-        title="Pirámide de edad (Izquierda: Hombres | Derecha: Mujeres)",
-        barmode='overlay',
-        xaxis=dict(tickmode='sync', title='Nº Personas'),
-        yaxis=dict(title='Edad'),
-        legend=dict(x=0, y=1.0),
-        plot_bgcolor='rgba(0,0,0,0)'
-    )
-    st.plotly_chart(fig_pyr, use_container_width=True)
-
-    st.markdown("---")
-
-    st.markdown("""
-    <div style="background-color: #262730; padding: 15px; border-radius: 8px; border-left: 5px solid GoldenRod; color: Gainsboro;">
-        <h5 style="margin: 0 0 10px 0; color: GoldenRod; font-size: 1rem;">Interpretación demográfica</h5>
-        <ul style="font-size: 0.9rem; line-height: 1.6; color: LightGray; margin-bottom: 0;">
-            <li>Pico laboral (25-45 años): El grueso de la siniestralidad ocurre en edad activa probablemente en desplazamientos al trabajo.</li>
-            <li>Los mayores (>65 años): Sufren una incidencia desproporcionada, casi siempre asociada a atropellos graves.</li>
-        </ul>
-    </div>
-    """, unsafe_allow_html=True)
+section_gender()
 # ==================================================
 # FOOTER
 # ==================================================